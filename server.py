@@ -4,9 +4,11 @@
 """
 
 import os
-import json
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Awaitable, Set
+import orjson
 from fastmcp import FastMCP
 from src.domi_nano_banana_mcp.tools import DomiNanoBananaAPI
 
@@ -14,23 +16,82 @@ from src.domi_nano_banana_mcp.tools import DomiNanoBananaAPI
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 支持的图片尺寸
+_VALID_SIZES = frozenset({"1x1", "3x4", "4x3", "9x16", "16x9"})
+_VALID_SIZES_STR = "1x1, 3x4, 4x3, 9x16, 16x9"
+
 # 创建MCP服务器实例
 mcp = FastMCP("多米nano-banana图像生成服务器")
 
-# 全局API客户端实例
-_api_client: Optional[DomiNanoBananaAPI] = None
+# API客户端缓存的最大条目数
+CLIENT_CACHE_SIZE = 8
+
+# API客户端缓存，按令牌复用客户端及其连接池（"_env"对应环境变量中的令牌），按LRU淘汰
+_client_cache: "OrderedDict[str, DomiNanoBananaAPI]" = OrderedDict()
+
+# 正在关闭的客户端任务，持有引用以免被垃圾回收
+_closing_clients: Set[asyncio.Task] = set()
+
+
+def get_api_client(api_token: Optional[str] = None) -> DomiNanoBananaAPI:
+    """获取API客户端实例，未缓存时创建新客户端"""
+    key = api_token or "_env"
+    client = _client_cache.get(key)
+    if client is None:
+        return DomiNanoBananaAPI(api_token=api_token)
+    _client_cache.move_to_end(key)
+    return client
+
+
+def _close_client_later(client: DomiNanoBananaAPI) -> None:
+    """在后台关闭客户端（等待其进行中的任务结束）"""
+    task = asyncio.ensure_future(client.aclose())
+    _closing_clients.add(task)
+    task.add_done_callback(_closing_clients.discard)
+
+
+def _release_api_client(
+    api_token: Optional[str],
+    client: DomiNanoBananaAPI,
+    result: Optional[Dict[str, Any]]
+) -> None:
+    """调用结束后处理客户端：令牌调用成功才缓存，否则关闭"""
+    key = api_token or "_env"
+    # 已缓存的客户端无需处理；已被淘汰的客户端正在关闭，等最后一个调用结束后自行关闭
+    if _client_cache.get(key) is client or client.closing:
+        return
+    if result and result.get("success") and key not in _client_cache:
+        _client_cache[key] = client
+        if len(_client_cache) > CLIENT_CACHE_SIZE:
+            _, evicted = _client_cache.popitem(last=False)
+            _close_client_later(evicted)
+    else:
+        _close_client_later(client)
 
 
-def get_api_client() -> DomiNanoBananaAPI:
-    """获取API客户端实例"""
-    global _api_client
-    if _api_client is None:
-        _api_client = DomiNanoBananaAPI()
-    return _api_client
+async def _call_api(
+    api_token: Optional[str],
+    call: Callable[[DomiNanoBananaAPI], Awaitable[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """获取客户端执行一次API调用，并在结束后决定是否缓存该客户端"""
+    client = get_api_client(api_token)
+    client.begin_call()
+    result = None
+    try:
+        result = await call(client)
+        return result
+    finally:
+        client.end_call()
+        _release_api_client(api_token, client, result)
+
+
+def _dumps(obj: Any) -> str:
+    """序列化工具返回结果（orjson默认输出UTF-8，不转义非ASCII字符）"""
+    return orjson.dumps(obj).decode()
 
 
 @mcp.tool
-def text_to_image(
+async def text_to_image(
     prompt: str,
     size: str = "1x1",
     seed: int = -1,
@@ -68,47 +129,145 @@ def text_to_image(
     try:
         # 验证必需参数
         if not prompt or not prompt.strip():
-            return json.dumps({
+            return _dumps({
                 "success": False,
                 "error": "Prompt is required and cannot be empty",
                 "error_code": "INVALID_PROMPT"
-            }, ensure_ascii=False)
+            })
         
         # 验证尺寸参数
-        valid_sizes = ["1x1", "3x4", "4x3", "9x16", "16x9"]
-        if size not in valid_sizes:
-            return json.dumps({
+        if size not in _VALID_SIZES:
+            return _dumps({
                 "success": False,
-                "error": f"Invalid size '{size}'. Must be one of: {', '.join(valid_sizes)}",
+                "error": f"Invalid size '{size}'. Must be one of: {_VALID_SIZES_STR}",
                 "error_code": "INVALID_SIZE"
-            }, ensure_ascii=False)
-        
-        # 创建API客户端
-        if api_token:
-            client = DomiNanoBananaAPI(api_token=api_token)
-        else:
-            client = get_api_client()
+            })
         
         # 调用API
-        result = client.text_to_image(
+        result = await _call_api(api_token, lambda client: client.text_to_image(
             prompt=prompt.strip(),
             size=size,
             seed=seed
-        )
+        ))
         
-        return json.dumps(result, ensure_ascii=False)
+        return _dumps(result)
         
     except Exception as e:
         logger.error(f"Text to image error: {str(e)}")
-        return json.dumps({
+        return _dumps({
+            "success": False,
+            "error": f"Internal server error: {str(e)}",
+            "error_code": "INTERNAL_ERROR"
+        })
+
+
+@mcp.tool
+async def submit_text_to_image(
+    prompt: str,
+    size: str = "1x1",
+    seed: int = -1,
+    api_token: Optional[str] = None
+) -> str:
+    """
+    提交文生图任务 - 立即返回任务ID，不等待生成完成
+    
+    适用于可以自行轮询结果的客户端。提交后使用get_task_status查询任务进度和结果。
+    同时进行的任务数达到上限（DOMI_MAX_CONCURRENCY）时不会等待，直接返回BUSY错误，可稍后重试。
+    
+    Args:
+        prompt: 图像描述文本，详细描述希望生成的图像内容
+        size: 图片尺寸，默认为"1x1"，可选值同text_to_image
+        seed: 随机种子，默认为-1（随机生成）
+        api_token: 多米API的Bearer Token，可选
+                  如果不提供，将从环境变量DOMI_API_TOKEN获取
+    
+    Returns:
+        JSON格式的结果字符串，包含：
+        - success: 提交是否成功
+        - task_id: 任务ID
+        - status: 任务状态（pending）
+        - error: 错误信息（如果失败）
+        - error_code: 错误代码（如果失败，并发已满时为BUSY）
+    """
+    try:
+        # 验证必需参数
+        if not prompt or not prompt.strip():
+            return _dumps({
+                "success": False,
+                "error": "Prompt is required and cannot be empty",
+                "error_code": "INVALID_PROMPT"
+            })
+        
+        # 验证尺寸参数
+        if size not in _VALID_SIZES:
+            return _dumps({
+                "success": False,
+                "error": f"Invalid size '{size}'. Must be one of: {_VALID_SIZES_STR}",
+                "error_code": "INVALID_SIZE"
+            })
+        
+        # 提交任务
+        result = await _call_api(api_token, lambda client: client.submit_text_to_image(
+            prompt=prompt.strip(),
+            size=size,
+            seed=seed
+        ))
+        
+        return _dumps(result)
+        
+    except Exception as e:
+        logger.error(f"Submit text to image error: {str(e)}")
+        return _dumps({
             "success": False,
             "error": f"Internal server error: {str(e)}",
             "error_code": "INTERNAL_ERROR"
-        }, ensure_ascii=False)
+        })
 
 
 @mcp.tool
-def image_edit(
+async def get_task_status(task_id: str, api_token: Optional[str] = None) -> str:
+    """
+    查询文生图任务状态
+    
+    查询submit_text_to_image提交的任务的当前状态，任务完成时返回图片URL。
+    
+    Args:
+        task_id: submit_text_to_image返回的任务ID
+        api_token: 多米API的Bearer Token，可选，应与提交任务时使用的令牌一致
+    
+    Returns:
+        JSON格式的结果字符串，包含：
+        - task_id: 任务ID
+        - status: 任务状态（pending/done/failed）
+        - image_url: 生成的图片URL地址（完成时）
+        - metadata: 图片元数据（完成时）
+        - error: 错误信息（如果失败）
+        - error_code: 错误代码（如果失败）
+    """
+    try:
+        if not task_id or not task_id.strip():
+            return _dumps({
+                "success": False,
+                "error": "Task ID is required and cannot be empty",
+                "error_code": "INVALID_TASK_ID"
+            })
+        
+        task_id = task_id.strip()
+        result = await _call_api(api_token, lambda client: client.get_task_status(task_id))
+        
+        return _dumps(result)
+        
+    except Exception as e:
+        logger.error(f"Get task status error: {str(e)}")
+        return _dumps({
+            "success": False,
+            "error": f"Internal server error: {str(e)}",
+            "error_code": "INTERNAL_ERROR"
+        })
+
+
+@mcp.tool
+async def image_edit(
     image: str,
     prompt: str,
     api_token: Optional[str] = None
@@ -137,46 +296,76 @@ def image_edit(
         - error_code: 错误代码（如果失败）
     """
     try:
+        image = image.strip() if image else ""
+        
         # 验证必需参数
-        if not image or not image.strip():
-            return json.dumps({
+        if not image:
+            return _dumps({
                 "success": False,
                 "error": "Image is required and cannot be empty",
                 "error_code": "INVALID_IMAGE"
-            }, ensure_ascii=False)
+            })
         
         if not prompt or not prompt.strip():
-            return json.dumps({
+            return _dumps({
                 "success": False,
                 "error": "Prompt is required and cannot be empty",
                 "error_code": "INVALID_PROMPT"
-            }, ensure_ascii=False)
-        
-        # 创建API客户端
-        if api_token:
-            client = DomiNanoBananaAPI(api_token=api_token)
-        else:
-            client = get_api_client()
+            })
         
         # 调用API
-        result = client.image_edit(
-            image=image.strip(),
+        result = await _call_api(api_token, lambda client: client.image_edit(
+            image=image,
             prompt=prompt.strip()
-        )
+        ))
         
-        return json.dumps(result, ensure_ascii=False)
+        return _dumps(result)
         
     except Exception as e:
         logger.error(f"Image edit error: {str(e)}")
-        return json.dumps({
+        return _dumps({
             "success": False,
             "error": f"Internal server error: {str(e)}",
             "error_code": "INTERNAL_ERROR"
-        }, ensure_ascii=False)
+        })
+
+
+# 支持的尺寸列表是固定内容，导入时序列化一次
+_SIZES_JSON = _dumps({
+    "supported_sizes": [
+        {
+            "size": "1x1",
+            "description": "正方形图片 (1024x1024)",
+            "use_case": "适合头像、图标、社交媒体帖子"
+        },
+        {
+            "size": "3x4",
+            "description": "垂直矩形 (768x1024)",
+            "use_case": "适合手机壁纸、海报、书籍封面"
+        },
+        {
+            "size": "4x3",
+            "description": "水平矩形 (1024x768)",
+            "use_case": "适合电脑壁纸、演示文稿、网页横幅"
+        },
+        {
+            "size": "9x16",
+            "description": "竖屏比例 (576x1024)",
+            "use_case": "适合抖音、快手等短视频平台"
+        },
+        {
+            "size": "16x9",
+            "description": "宽屏比例 (1024x576)",
+            "use_case": "适合YouTube缩略图、宽屏视频"
+        }
+    ],
+    "default_size": "1x1",
+    "recommendation": "选择尺寸时考虑最终使用场景，以获得最佳显示效果"
+})
 
 
 @mcp.tool
-def get_supported_sizes() -> str:
+async def get_supported_sizes() -> str:
     """
     获取支持的图片尺寸列表
     
@@ -185,43 +374,11 @@ def get_supported_sizes() -> str:
     Returns:
         JSON格式的尺寸列表信息
     """
-    sizes_info = {
-        "supported_sizes": [
-            {
-                "size": "1x1",
-                "description": "正方形图片 (1024x1024)",
-                "use_case": "适合头像、图标、社交媒体帖子"
-            },
-            {
-                "size": "3x4",
-                "description": "垂直矩形 (768x1024)",
-                "use_case": "适合手机壁纸、海报、书籍封面"
-            },
-            {
-                "size": "4x3",
-                "description": "水平矩形 (1024x768)",
-                "use_case": "适合电脑壁纸、演示文稿、网页横幅"
-            },
-            {
-                "size": "9x16",
-                "description": "竖屏比例 (576x1024)",
-                "use_case": "适合抖音、快手等短视频平台"
-            },
-            {
-                "size": "16x9",
-                "description": "宽屏比例 (1024x576)",
-                "use_case": "适合YouTube缩略图、宽屏视频"
-            }
-        ],
-        "default_size": "1x1",
-        "recommendation": "选择尺寸时考虑最终使用场景，以获得最佳显示效果"
-    }
-    
-    return json.dumps(sizes_info, ensure_ascii=False)
+    return _SIZES_JSON
 
 
 @mcp.tool
-def validate_api_token(api_token: str) -> str:
+async def validate_api_token(api_token: str) -> str:
     """
     验证API令牌的有效性
     
@@ -234,36 +391,79 @@ def validate_api_token(api_token: str) -> str:
         JSON格式的验证结果
     """
     try:
-        # 创建临时客户端进行验证
+        # 创建临时客户端进行验证，不放入客户端缓存
         client = DomiNanoBananaAPI(api_token=api_token)
+        try:
+            # 只做一次轻量的鉴权请求，不触发图像生成
+            result = await client.validate_token()
+        finally:
+            await client.aclose()
         
-        # 尝试一个简单的API调用来验证令牌
-        test_result = client.text_to_image(
-            prompt="test",
-            size="1x1",
-            seed=1
-        )
-        
-        # 如果API调用成功（即使生成失败），说明令牌有效
-        if "error_code" not in test_result or test_result["error_code"] not in ["INVALID_PROMPT", "INVALID_SIZE"]:
-            return json.dumps({
+        if result["valid"]:
+            return _dumps({
                 "valid": True,
                 "message": "API token is valid",
-                "test_result": test_result
-            }, ensure_ascii=False)
+                "status_code": result["status_code"]
+            })
         else:
-            return json.dumps({
+            return _dumps({
                 "valid": False,
                 "message": "API token appears to be invalid",
-                "error": test_result.get("error", "Unknown validation error")
-            }, ensure_ascii=False)
+                "error": result.get("error", "Unknown validation error"),
+                "error_code": result.get("error_code")
+            })
             
     except Exception as e:
-        return json.dumps({
+        return _dumps({
             "valid": False,
             "message": f"Token validation failed: {str(e)}",
             "error": str(e)
-        }, ensure_ascii=False)
+        })
+
+
+# 提示词模板中使用的风格描述
+_STYLE_DESCRIPTIONS = {
+    "realistic": "照片级真实感，高清细节，专业摄影",
+    "artistic": "艺术风格，创意构图，色彩丰富",
+    "cartoon": "卡通风格，可爱生动，色彩鲜明",
+    "anime": "动漫风格，精致画风，角色设计",
+    "abstract": "抽象艺术，现代设计，概念表达",
+    "vintage": "复古风格，怀旧色调，经典构图",
+    "minimalist": "极简主义，简洁设计，留白艺术"
+}
+
+# 图像生成提示词模板
+_GEN_TMPL = """
+创建一个关于{subject}的{style_desc}图像。
+
+建议的构图和细节：
+- 主体：{subject}
+- 风格：{style_desc}
+- 尺寸：{size}
+- 质量：高清，细节丰富，色彩饱满
+- 光线：自然光线，层次分明
+- 构图：居中对称，视觉平衡
+
+请确保图像具有专业水准，适合商业或艺术用途。
+""".strip()
+
+# 图像编辑提示词模板
+_EDIT_TMPL = """
+基于以下原图进行智能编辑：
+
+原图描述：{original_description}
+
+编辑需求：{editing_request}
+
+编辑指导原则：
+1. 保持原图的主要构图和风格
+2. 自然融合编辑内容，避免违和感
+3. 保持色彩协调和视觉平衡
+4. 确保编辑后的图像质量清晰
+5. 符合实际的物理规律和美学原则
+
+请生成高质量的编辑结果，确保编辑内容与原图完美融合。
+""".strip()
 
 
 @mcp.prompt
@@ -282,33 +482,9 @@ def image_generation_prompt(subject: str, style: str = "realistic", size: str =
     Returns:
         优化的提示词文本
     """
-    style_descriptions = {
-        "realistic": "照片级真实感，高清细节，专业摄影",
-        "artistic": "艺术风格，创意构图，色彩丰富",
-        "cartoon": "卡通风格，可爱生动，色彩鲜明",
-        "anime": "动漫风格，精致画风，角色设计",
-        "abstract": "抽象艺术，现代设计，概念表达",
-        "vintage": "复古风格，怀旧色调，经典构图",
-        "minimalist": "极简主义，简洁设计，留白艺术"
-    }
+    style_desc = _STYLE_DESCRIPTIONS.get(style, _STYLE_DESCRIPTIONS["realistic"])
     
-    style_desc = style_descriptions.get(style, style_descriptions["realistic"])
-    
-    prompt_template = f"""
-创建一个关于{subject}的{style_desc}图像。
-
-建议的构图和细节：
-- 主体：{subject}
-- 风格：{style_desc}
-- 尺寸：{size}
-- 质量：高清，细节丰富，色彩饱满
-- 光线：自然光线，层次分明
-- 构图：居中对称，视觉平衡
-
-请确保图像具有专业水准，适合商业或艺术用途。
-"""
-    
-    return prompt_template.strip()
+    return _GEN_TMPL.format_map({"subject": subject, "style_desc": style_desc, "size": size})
 
 
 @mcp.prompt
@@ -325,24 +501,10 @@ def image_editing_prompt(original_description: str, editing_request: str) -> str
     Returns:
         详细的编辑指令文本
     """
-    prompt_template = f"""
-基于以下原图进行智能编辑：
-
-原图描述：{original_description}
-
-编辑需求：{editing_request}
-
-编辑指导原则：
-1. 保持原图的主要构图和风格
-2. 自然融合编辑内容，避免违和感
-3. 保持色彩协调和视觉平衡
-4. 确保编辑后的图像质量清晰
-5. 符合实际的物理规律和美学原则
-
-请生成高质量的编辑结果，确保编辑内容与原图完美融合。
-"""
-    
-    return prompt_template.strip()
+    return _EDIT_TMPL.format_map({
+        "original_description": original_description,
+        "editing_request": editing_request
+    })
 
 
 if __name__ == "__main__":
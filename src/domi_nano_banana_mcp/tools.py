@@ -4,56 +4,192 @@
 """
 
 import os
-import json
 import time
+import logging
+import random
+import asyncio
+import re
 import base64
-import requests
+import itertools
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import orjson
+import httpx
 from typing import Dict, Any, Optional, List, Union
-from urllib.parse import urlparse
 
 
+# 支持的图片尺寸
+_VALID_SIZES = frozenset({"1x1", "3x4", "4x3", "9x16", "16x9"})
+_VALID_SIZES_STR = "1x1, 3x4, 4x3, 9x16, 16x9"
+
+# 图片输入格式判断用的预编译正则
+_B64_RE = re.compile(r'^[A-Za-z0-9+/]+=*$')
+
+logger = logging.getLogger(__name__)
+
+# 默认的并发任务数上限
+DEFAULT_MAX_CONCURRENCY = 16
+
+
+def _max_concurrency() -> int:
+    """读取DOMI_MAX_CONCURRENCY，无效值回退到默认值，并保证至少为1"""
+    raw = os.getenv("DOMI_MAX_CONCURRENCY")
+    if raw is None:
+        return DEFAULT_MAX_CONCURRENCY
+    try:
+        value = int(raw)
+    except ValueError:
+        logger.warning(f"Invalid DOMI_MAX_CONCURRENCY '{raw}', using {DEFAULT_MAX_CONCURRENCY}")
+        return DEFAULT_MAX_CONCURRENCY
+    if value < 1:
+        logger.warning(f"DOMI_MAX_CONCURRENCY must be at least 1, got {value}; using 1")
+        return 1
+    return value
+
+
+# 同时进行的远程生成/编辑任务数上限，可通过环境变量按API配额调整
+_GEN_SEMA = asyncio.Semaphore(_max_concurrency())
+
+# 已完成任务在注册表中保留的时长（秒），超时未被查询的结果会被清理
+TASK_RESULT_TTL = 600.0
+
+# 轮询总时长上限（秒）
+POLL_TIMEOUT = 150.0
+
+
+def _poll_delay(attempt: int) -> float:
+    """计算第attempt次轮询前的等待时间：从0.5秒起指数增长，上限5秒，并加入少量抖动"""
+    return min(5.0, 0.5 * (1.6 ** attempt)) + random.uniform(0, 0.3)
+
+
+# 文生图结果缓存（每个客户端）的最大条目数
+CACHE_MAX_SIZE = 256
+
+# 文生图结果缓存的有效期（秒），远程图片URL不保证长期有效
+CACHE_TTL = 3600.0
+
+
+def _cache_key(prompt: str, size: str, seed: int) -> tuple:
+    """构建缓存键，提示词忽略大小写和多余空白"""
+    return (" ".join(prompt.lower().split()), size, seed)
+
+
+@dataclass(slots=True, eq=False)
 class DomiNanoBananaAPI:
-    """多米nano-banana API客户端"""
+    """
+    多米nano-banana API客户端
     
-    def __init__(self, api_token: Optional[str] = None):
-        """
-        初始化API客户端
-        
-        Args:
-            api_token: API认证令牌，如果为None则从环境变量获取
-        """
-        self.api_token = api_token or os.getenv('DOMI_API_TOKEN')
+    Args:
+        api_token: API认证令牌，如果为None则从环境变量获取
+        base_url: 多米API地址
+    """
+    
+    api_token: Optional[str] = field(default=None, repr=False)
+    base_url: str = "https://duomiapi.com"
+    
+    text_to_image_url: str = field(init=False, repr=False)
+    image_edit_url: str = field(init=False, repr=False)
+    status_url: str = field(init=False, repr=False)
+    headers: Dict[str, str] = field(init=False, repr=False)
+    session: httpx.AsyncClient = field(init=False, repr=False)
+    _tasks: Dict[str, asyncio.Task] = field(init=False, repr=False)
+    _inflight: Dict[tuple, asyncio.Future] = field(init=False, repr=False)
+    _result_cache: "OrderedDict[tuple, tuple]" = field(init=False, repr=False)
+    _active_calls: int = field(init=False, repr=False)
+    _idle: asyncio.Event = field(init=False, repr=False)
+    closing: bool = field(init=False, repr=False)
+    
+    def __post_init__(self):
+        """初始化API客户端"""
+        self.api_token = self.api_token or os.getenv('DOMI_API_TOKEN')
         
         # 多米API端点
-        self.base_url = "https://duomiapi.com"
         self.text_to_image_url = f"{self.base_url}/api/gemini/nano-banana"
         self.image_edit_url = f"{self.base_url}/api/gemini/nano-banana-edit"
+        self.status_url = f"{self.base_url}/api/gemini/nano-banana/status"
         
-        # 请求头
-        self.headers = {
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
+        # 请求头，未配置令牌时不发送Authorization
+        self.headers = {"Content-Type": "application/json"}
+        if self.api_token:
+            self.headers["Authorization"] = f"Bearer {self.api_token}"
+        
+        # 复用连接的异步HTTP会话，同一客户端的提交和轮询请求共享TLS连接
+        self.session = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=httpx.Timeout(120.0),
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            http2=True
+        )
+        
+        # 后台轮询任务注册表：task_id -> 驱动该任务轮询的asyncio.Task
+        self._tasks = {}
+        
+        # 进行中的文生图请求：请求键 -> 共享结果的Future，用于合并重复请求
+        self._inflight = {}
+        
+        # 文生图结果缓存：请求键 -> (过期时间, 成功的生成结果)，按LRU淘汰，
+        # 挂在客户端上以保证不同令牌之间互不共享结果
+        self._result_cache = OrderedDict()
+        
+        # 正在使用本客户端的调用数，归零时_idle被设置；closing表示已开始关闭
+        self._active_calls = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.closing = False
+    
+    def _expire_task(self, task_id: str, task: asyncio.Task) -> None:
+        """任务完成后在TASK_RESULT_TTL秒后将其移出注册表"""
+        def forget() -> None:
+            if self._tasks.get(task_id) is task:
+                del self._tasks[task_id]
+        
+        asyncio.get_running_loop().call_later(TASK_RESULT_TTL, forget)
+    
+    def begin_call(self) -> None:
+        """登记一次正在使用本客户端的调用"""
+        self._active_calls += 1
+        self._idle.clear()
+    
+    def end_call(self) -> None:
+        """结束一次调用登记"""
+        self._active_calls -= 1
+        if self._active_calls == 0:
+            self._idle.set()
+    
+    async def aclose(self) -> None:
+        """等待进行中的调用和任务结束后关闭HTTP会话"""
+        self.closing = True
+        await self._idle.wait()
+        pending = [t for t in (*self._tasks.values(), *self._inflight.values()) if not t.done()]
+        if pending:
+            await asyncio.wait(pending)
+        await self.session.aclose()
     
     def _validate_image_url(self, url: str) -> bool:
         """验证图片URL是否有效"""
-        try:
-            parsed = urlparse(url)
-            return bool(parsed.scheme and parsed.netloc)
-        except Exception:
-            return False
+        return (
+            url.startswith(("http://", "https://"))
+            and len(url) < 8192
+            and not any(c.isspace() for c in url)
+        )
     
     def _is_base64(self, data: str) -> bool:
         """检查字符串是否为base64编码"""
         if not data or not data.strip():
             return False
+        # URL无需解码即可排除
+        if data.startswith(('http://', 'https://')):
+            return False
+        # 先用长度和前缀做廉价预检，再只解码开头一小段，避免对大图整体解码
+        if len(data) % 4 != 0 or not _B64_RE.match(data[:64]):
+            return False
         try:
-            base64.b64decode(data, validate=True)
+            base64.b64decode(data[:256], validate=True)
             return True
         except Exception:
             return False
     
-    def text_to_image(
+    async def text_to_image(
         self, 
         prompt: str, 
         size: str = "1x1", 
@@ -63,6 +199,8 @@ class DomiNanoBananaAPI:
         """
         文生图功能
         
+        提交生成任务并等待其完成。
+        
         Args:
             prompt: 图像描述文本
             size: 图片尺寸，支持: 1x1, 3x4, 4x3, 9x16, 16x9
@@ -72,6 +210,82 @@ class DomiNanoBananaAPI:
         Returns:
             包含生成结果的字典
         """
+        # 固定种子的相同请求结果可复现，直接返回缓存；seed为-1时每次都应生成新图
+        if not self.api_token or seed == -1 or kwargs:
+            return await self._run_text_to_image(prompt, size, seed, **kwargs)
+        
+        cache_key = _cache_key(prompt, size, seed)
+        cached = self._result_cache.get(cache_key)
+        if cached is not None:
+            expires_at, cached_result = cached
+            if time.monotonic() < expires_at:
+                self._result_cache.move_to_end(cache_key)
+                return cached_result
+            del self._result_cache[cache_key]
+        
+        # 相同请求已在进行中时等待其结果，避免重复提交远程任务
+        inflight = self._inflight.get(cache_key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._run_and_cache(cache_key, prompt, size, seed))
+            self._inflight[cache_key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        
+        return await asyncio.shield(inflight)
+    
+    async def _run_and_cache(self, cache_key: tuple, prompt: str, size: str, seed: int) -> Dict[str, Any]:
+        """执行文生图并缓存成功结果，即使所有等待者都已取消也会写入缓存"""
+        final = await self._run_text_to_image(prompt, size, seed)
+        
+        if final.get("success"):
+            self._result_cache[cache_key] = (time.monotonic() + CACHE_TTL, final)
+            self._result_cache.move_to_end(cache_key)
+            if len(self._result_cache) > CACHE_MAX_SIZE:
+                self._result_cache.popitem(last=False)
+        return final
+    
+    async def _run_text_to_image(
+        self, 
+        prompt: str, 
+        size: str, 
+        seed: int,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """提交文生图任务并等待后台轮询结果"""
+        submitted = await self.submit_text_to_image(prompt, size, seed, wait=True, **kwargs)
+        if not submitted["success"]:
+            return submitted
+        
+        task_id = submitted["task_id"]
+        try:
+            return await self._tasks[task_id]
+        finally:
+            self._tasks.pop(task_id, None)
+    
+    async def submit_text_to_image(
+        self, 
+        prompt: str, 
+        size: str = "1x1", 
+        seed: int = -1,
+        *,
+        wait: bool = False,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        提交文生图任务
+        
+        提交成功后立即返回任务ID，并在后台轮询任务状态，
+        结果可通过get_task_status获取。
+        
+        Args:
+            prompt: 图像描述文本
+            size: 图片尺寸，支持: 1x1, 3x4, 4x3, 9x16, 16x9
+            seed: 随机种子，-1表示随机
+            wait: 并发名额已满时是否等待空闲名额，为False时直接返回BUSY错误
+            **kwargs: 其他参数
+            
+        Returns:
+            包含任务ID的字典
+        """
         # 验证API token
         if not self.api_token:
             return {
@@ -89,11 +303,10 @@ class DomiNanoBananaAPI:
                     "error_code": "INVALID_PROMPT"
                 }
             
-            valid_sizes = ["1x1", "3x4", "4x3", "9x16", "16x9"]
-            if size not in valid_sizes:
+            if size not in _VALID_SIZES:
                 return {
                     "success": False,
-                    "error": f"Invalid size '{size}'. Must be one of: {', '.join(valid_sizes)}",
+                    "error": f"Invalid size '{size}'. Must be one of: {_VALID_SIZES_STR}",
                     "error_code": "INVALID_SIZE"
                 }
             
@@ -111,50 +324,72 @@ class DomiNanoBananaAPI:
                 if value is not None:
                     payload[key] = value
             
-            # 发送请求
-            response = requests.post(
-                self.text_to_image_url,
-                headers=self.headers,
-                json=payload,
-                timeout=60
-            )
+            # 并发名额已满且不等待时直接返回，保证提交接口立即响应
+            if not wait and _GEN_SEMA.locked():
+                return {
+                    "success": False,
+                    "error": "Too many concurrent generation tasks. Please retry later.",
+                    "error_code": "BUSY"
+                }
             
-            # 处理响应
-            if response.status_code == 200:
-                result = response.json()
+            # 占用一个并发名额，提交失败时立即释放，提交成功则在后台轮询结束后释放
+            await _GEN_SEMA.acquire()
+            task = None
+            try:
+                # 发送请求
+                response = await self.session.post(
+                    self.text_to_image_url,
+                    content=orjson.dumps(payload),
+                    timeout=60
+                )
                 
-                # 多米API异步任务模式
-                if result.get("code") == 200 and "data" in result and "task_id" in result["data"]:
-                    # 获取任务ID并轮询状态
-                    task_id = result["data"]["task_id"]
-                    return self._poll_generation_status(task_id)
+                # 处理响应
+                if response.status_code == 200:
+                    result = orjson.loads(response.content)
+                    
+                    # 多米API异步任务模式
+                    if result.get("code") == 200 and "data" in result and "task_id" in result["data"]:
+                        # 获取任务ID并在后台轮询状态
+                        task_id = result["data"]["task_id"]
+                        task = asyncio.create_task(self._poll_generation_status(task_id))
+                        task.add_done_callback(lambda _: _GEN_SEMA.release())
+                        task.add_done_callback(lambda t: self._expire_task(task_id, t))
+                        self._tasks[task_id] = task
+                        return {
+                            "success": True,
+                            "task_id": task_id,
+                            "status": "pending"
+                        }
+                    else:
+                        return {
+                            "success": False,
+                            "error": f"Unexpected API response format: {result}",
+                            "error_code": "UNEXPECTED_RESPONSE"
+                        }
                 else:
+                    error_msg = f"API request failed with status {response.status_code}"
+                    try:
+                        error_detail = orjson.loads(response.content)
+                        error_msg += f": {error_detail}"
+                    except orjson.JSONDecodeError:
+                        error_msg += f": {response.text}"
+                    
                     return {
                         "success": False,
-                        "error": f"Unexpected API response format: {result}",
-                        "error_code": "UNEXPECTED_RESPONSE"
+                        "error": error_msg,
+                        "error_code": "API_ERROR"
                     }
-            else:
-                error_msg = f"API request failed with status {response.status_code}"
-                try:
-                    error_detail = response.json()
-                    error_msg += f": {error_detail}"
-                except:
-                    error_msg += f": {response.text}"
-                
-                return {
-                    "success": False,
-                    "error": error_msg,
-                    "error_code": "API_ERROR"
-                }
+            finally:
+                if task is None:
+                    _GEN_SEMA.release()
                 
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             return {
                 "success": False,
                 "error": "Request timeout",
                 "error_code": "TIMEOUT"
             }
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             return {
                 "success": False,
                 "error": f"Request failed: {str(e)}",
@@ -167,7 +402,7 @@ class DomiNanoBananaAPI:
                 "error_code": "UNKNOWN_ERROR"
             }
     
-    def image_edit(
+    async def image_edit(
         self,
         image: str,
         prompt: str,
@@ -193,8 +428,11 @@ class DomiNanoBananaAPI:
             }
         
         try:
+            # 只去除一次首尾空白，避免对大体积base64数据重复扫描和复制
+            image = image.strip() if image else ""
+            
             # 验证参数
-            if not image or not image.strip():
+            if not image:
                 return {
                     "success": False,
                     "error": "Image cannot be empty",
@@ -208,12 +446,8 @@ class DomiNanoBananaAPI:
                     "error_code": "INVALID_PROMPT"
                 }
             
-            # 确定图片输入格式
-            if self._validate_image_url(image):
-                image_input = {"url": image.strip()}
-            elif self._is_base64(image):
-                image_input = {"data": image.strip()}
-            else:
+            # 验证图片输入格式：URL直接通过，无需再做base64检查
+            if not self._validate_image_url(image) and not self._is_base64(image):
                 return {
                     "success": False,
                     "error": "Invalid image format. Must be a valid URL or base64 encoded string",
@@ -223,7 +457,7 @@ class DomiNanoBananaAPI:
             # 构建请求数据 - 多米API图片编辑格式
             payload = {
                 "prompt": prompt.strip(),
-                "image_urls": [image.strip()] if isinstance(image, str) else [image]
+                "image_urls": [image]
             }
             
             # 添加其他参数
@@ -231,49 +465,50 @@ class DomiNanoBananaAPI:
                 if value is not None:
                     payload[key] = value
             
-            # 发送请求
-            response = requests.post(
-                self.image_edit_url,
-                headers=self.headers,
-                json=payload,
-                timeout=120  # 编辑可能需要更长时间
-            )
-            
-            # 处理响应 - 多米API图片编辑格式
-            if response.status_code == 200:
-                result = response.json()
+            # 占用一个并发名额直到编辑任务结束
+            async with _GEN_SEMA:
+                # 发送请求
+                response = await self.session.post(
+                    self.image_edit_url,
+                    content=orjson.dumps(payload),
+                    timeout=120  # 编辑可能需要更长时间
+                )
                 
-                # 多米API图片编辑返回异步任务格式
-                if result.get("code") == 200 and "data" in result and "task_id" in result["data"]:
-                    task_id = result["data"]["task_id"]
-                    return self._poll_edit_status(task_id)
+                # 处理响应 - 多米API图片编辑格式
+                if response.status_code == 200:
+                    result = orjson.loads(response.content)
+                    
+                    # 多米API图片编辑返回异步任务格式
+                    if result.get("code") == 200 and "data" in result and "task_id" in result["data"]:
+                        task_id = result["data"]["task_id"]
+                        return await self._poll_edit_status(task_id)
+                    else:
+                        return {
+                            "success": False,
+                            "error": f"Unexpected edit API response: {result}",
+                            "error_code": "UNEXPECTED_EDIT_RESPONSE"
+                        }
                 else:
+                    error_msg = f"API request failed with status {response.status_code}"
+                    try:
+                        error_detail = orjson.loads(response.content)
+                        error_msg += f": {error_detail}"
+                    except orjson.JSONDecodeError:
+                        error_msg += f": {response.text}"
+                    
                     return {
                         "success": False,
-                        "error": f"Unexpected edit API response: {result}",
-                        "error_code": "UNEXPECTED_EDIT_RESPONSE"
+                        "error": error_msg,
+                        "error_code": "API_ERROR"
                     }
-            else:
-                error_msg = f"API request failed with status {response.status_code}"
-                try:
-                    error_detail = response.json()
-                    error_msg += f": {error_detail}"
-                except:
-                    error_msg += f": {response.text}"
-                
-                return {
-                    "success": False,
-                    "error": error_msg,
-                    "error_code": "API_ERROR"
-                }
                 
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             return {
                 "success": False,
                 "error": "Request timeout",
                 "error_code": "TIMEOUT"
             }
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             return {
                 "success": False,
                 "error": f"Request failed: {str(e)}",
@@ -286,33 +521,34 @@ class DomiNanoBananaAPI:
                 "error_code": "UNKNOWN_ERROR"
             }
     
-    def _poll_edit_status(self, task_id: str, max_attempts: int = 30) -> Dict[str, Any]:
+    async def _poll_edit_status(self, task_id: str, timeout: float = POLL_TIMEOUT) -> Dict[str, Any]:
         """
         轮询异步编辑任务状态
         
         Args:
             task_id: 编辑任务ID
-            max_attempts: 最大轮询次数
+            timeout: 轮询总时长上限（秒）
             
         Returns:
             最终结果
         """
-        status_url = f"{self.base_url}/api/gemini/nano-banana/status"
+        deadline = time.monotonic() + timeout
         
-        for attempt in range(max_attempts):
+        for attempt in itertools.count():
+            if time.monotonic() >= deadline:
+                break
             try:
                 # 构建状态查询请求
                 payload = {"id": task_id}
                 
-                response = requests.post(
-                    status_url,
-                    headers=self.headers,
-                    json=payload,
+                response = await self.session.post(
+                    self.status_url,
+                    content=orjson.dumps(payload),
                     timeout=30
                 )
                 
                 if response.status_code == 200:
-                    result = response.json()
+                    result = orjson.loads(response.content)
                     
                     # 检查状态
                     if result.get("code") == 200 and "data" in result:
@@ -355,7 +591,7 @@ class DomiNanoBananaAPI:
                             }
                         elif status_code in ["0", "1", "2"] or status in ["pending", "processing", "queued", "running"]:
                             # 继续轮询
-                            time.sleep(3)
+                            await asyncio.sleep(_poll_delay(attempt))
                             continue
                         else:
                             return {
@@ -377,13 +613,13 @@ class DomiNanoBananaAPI:
                     }
                     
             except Exception as e:
-                if attempt == max_attempts - 1:
+                if time.monotonic() >= deadline:
                     return {
                         "success": False,
                         "error": f"Edit status polling failed: {str(e)}",
                         "error_code": "POLLING_ERROR"
                     }
-                time.sleep(3)
+                await asyncio.sleep(_poll_delay(attempt))
         
         return {
             "success": False,
@@ -391,110 +627,229 @@ class DomiNanoBananaAPI:
             "error_code": "TIMEOUT"
         }
     
-    def _poll_generation_status(self, task_id: str, max_attempts: int = 30) -> Dict[str, Any]:
+    async def _check_generation_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         """
-        轮询文生图任务状态
+        查询一次文生图任务状态
         
         Args:
             task_id: 任务ID
-            max_attempts: 最大轮询次数
             
         Returns:
-            最终结果
+            任务结束时返回最终结果，仍在进行中时返回None
         """
-        status_url = f"{self.base_url}/api/gemini/nano-banana/status"
+        # 构建状态查询请求 - 多米API使用"id"参数
+        payload = {"id": task_id}
         
-        for attempt in range(max_attempts):
-            try:
-                # 构建状态查询请求 - 多米API使用"id"参数
-                payload = {"id": task_id}
+        response = await self.session.post(
+            self.status_url,
+            content=orjson.dumps(payload),
+            timeout=30
+        )
+        
+        if response.status_code == 200:
+            result = orjson.loads(response.content)
+            
+            # 检查状态 - 多米API响应格式
+            if result.get("code") == 200 and "data" in result:
+                status_data = result["data"]
+                status = status_data.get("state", "unknown")  # 使用state字段
                 
-                response = requests.post(
-                    status_url,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=30
-                )
+                # 多米API状态码：0=pending, 1=running, 2=processing, 3=succeeded, 4=failed
+                status_code = status_data.get("status", "0")
                 
-                if response.status_code == 200:
-                    result = response.json()
+                if status == "succeeded" or status_code == "3":
+                    # 任务完成，提取图片URL
+                    image_url = ""
+                    if "data" in status_data and "images" in status_data["data"]:
+                        images = status_data["data"]["images"]
+                        if len(images) > 0:
+                            image_url = images[0].get("url", "")
                     
-                    # 检查状态 - 多米API响应格式
-                    if result.get("code") == 200 and "data" in result:
-                        status_data = result["data"]
-                        status = status_data.get("state", "unknown")  # 使用state字段
-                        
-                        # 多米API状态码：0=pending, 1=running, 2=processing, 3=succeeded, 4=failed
-                        status_code = status_data.get("status", "0")
-                        
-                        if status == "succeeded" or status_code == "3":
-                            # 任务完成，提取图片URL
-                            image_url = ""
-                            if "data" in status_data and "images" in status_data["data"]:
-                                images = status_data["data"]["images"]
-                                if len(images) > 0:
-                                    image_url = images[0].get("url", "")
-                            
-                            if image_url:
-                                return {
-                                    "success": True,
-                                    "image_url": image_url,
-                                    "metadata": {
-                                        "task_id": task_id,
-                                        "status": status,
-                                        "status_code": status_code,
-                                        "create_time": status_data.get("create_time"),
-                                        "update_time": status_data.get("update_time"),
-                                        "model": "nano-banana"
-                                    }
-                                }
-                            else:
-                                return {
-                                    "success": False,
-                                    "error": f"No image URL in completed task: {status_data}",
-                                    "error_code": "NO_IMAGE_IN_COMPLETED_TASK"
-                                }
-                        elif status == "failed" or status_code == "4":
-                            error_msg = status_data.get("msg", "Image generation failed")
-                            return {
-                                "success": False,
-                                "error": error_msg,
-                                "error_code": "GENERATION_FAILED"
-                            }
-                        elif status_code in ["0", "1", "2"] or status in ["pending", "processing", "queued", "running"]:
-                            # 继续轮询
-                            time.sleep(3)
-                            continue
-                        else:
-                            return {
-                                "success": False,
-                                "error": f"Unknown task status: {status} (raw: {status_data.get('status')})",
-                                "error_code": "UNKNOWN_STATUS"
+                    if image_url:
+                        return {
+                            "success": True,
+                            "image_url": image_url,
+                            "metadata": {
+                                "task_id": task_id,
+                                "status": status,
+                                "status_code": status_code,
+                                "create_time": status_data.get("create_time"),
+                                "update_time": status_data.get("update_time"),
+                                "model": "nano-banana"
                             }
+                        }
                     else:
                         return {
                             "success": False,
-                            "error": f"Invalid status response: {result}",
-                            "error_code": "INVALID_STATUS_RESPONSE"
+                            "error": f"No image URL in completed task: {status_data}",
+                            "error_code": "NO_IMAGE_IN_COMPLETED_TASK"
                         }
+                elif status == "failed" or status_code == "4":
+                    error_msg = status_data.get("msg", "Image generation failed")
+                    return {
+                        "success": False,
+                        "error": error_msg,
+                        "error_code": "GENERATION_FAILED"
+                    }
+                elif status_code in ["0", "1", "2"] or status in ["pending", "processing", "queued", "running"]:
+                    # 任务仍在进行中
+                    return None
                 else:
                     return {
                         "success": False,
-                        "error": f"Status check failed with status {response.status_code}: {response.text}",
-                        "error_code": "STATUS_CHECK_ERROR"
+                        "error": f"Unknown task status: {status} (raw: {status_data.get('status')})",
+                        "error_code": "UNKNOWN_STATUS"
                     }
-                    
+            else:
+                return {
+                    "success": False,
+                    "error": f"Invalid status response: {result}",
+                    "error_code": "INVALID_STATUS_RESPONSE"
+                }
+        else:
+            return {
+                "success": False,
+                "error": f"Status check failed with status {response.status_code}: {response.text}",
+                "error_code": "STATUS_CHECK_ERROR"
+            }
+    
+    async def _poll_generation_status(self, task_id: str, timeout: float = POLL_TIMEOUT) -> Dict[str, Any]:
+        """
+        轮询文生图任务状态
+        
+        Args:
+            task_id: 任务ID
+            timeout: 轮询总时长上限（秒）
+            
+        Returns:
+            最终结果
+        """
+        deadline = time.monotonic() + timeout
+        
+        for attempt in itertools.count():
+            if time.monotonic() >= deadline:
+                break
+            try:
+                result = await self._check_generation_status(task_id)
             except Exception as e:
-                if attempt == max_attempts - 1:
+                if time.monotonic() >= deadline:
                     return {
                         "success": False,
                         "error": f"Status polling failed: {str(e)}",
                         "error_code": "POLLING_ERROR"
                     }
-                time.sleep(3)
+                result = None
+            
+            if result is not None:
+                return result
+            
+            # 继续轮询
+            await asyncio.sleep(_poll_delay(attempt))
         
         return {
             "success": False,
             "error": "Image generation timeout",
             "error_code": "TIMEOUT"
-        }
\ No newline at end of file
+        }
+    
+    async def get_task_status(self, task_id: str) -> Dict[str, Any]:
+        """
+        获取文生图任务状态
+        
+        本客户端提交的任务直接读取后台轮询结果，其他任务向API查询一次状态。
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            包含任务状态（pending/done/failed）的字典，完成时附带图片URL
+        """
+        # 验证API token
+        if not self.api_token:
+            return {
+                "success": False,
+                "error": "API token is required. Set DOMI_API_TOKEN environment variable or pass api_token parameter.",
+                "error_code": "MISSING_API_TOKEN"
+            }
+        
+        task = self._tasks.get(task_id)
+        if task is not None:
+            if not task.done():
+                return {"success": True, "task_id": task_id, "status": "pending"}
+            del self._tasks[task_id]
+            result = task.result()
+        else:
+            try:
+                result = await self._check_generation_status(task_id)
+            except Exception as e:
+                return {
+                    "success": False,
+                    "task_id": task_id,
+                    "status": "failed",
+                    "error": f"Status check failed: {str(e)}",
+                    "error_code": "STATUS_CHECK_ERROR"
+                }
+            if result is None:
+                return {"success": True, "task_id": task_id, "status": "pending"}
+        
+        return {
+            "task_id": task_id,
+            "status": "done" if result.get("success") else "failed",
+            **result
+        }
+    
+    async def validate_token(self) -> Dict[str, Any]:
+        """
+        验证API令牌
+        
+        向状态查询接口发送一个不存在的任务ID，只根据鉴权结果判断令牌是否有效，
+        不会触发图像生成。
+        
+        Returns:
+            包含验证结果的字典
+        """
+        if not self.api_token:
+            return {
+                "valid": False,
+                "error": "API token is required. Set DOMI_API_TOKEN environment variable or pass api_token parameter.",
+                "error_code": "MISSING_API_TOKEN"
+            }
+        
+        try:
+            response = await self.session.post(
+                self.status_url,
+                content=orjson.dumps({"id": "__probe__"}),
+                timeout=5
+            )
+        except httpx.TimeoutException:
+            return {
+                "valid": False,
+                "error": "Request timeout",
+                "error_code": "TIMEOUT"
+            }
+        except httpx.HTTPError as e:
+            return {
+                "valid": False,
+                "error": f"Request failed: {str(e)}",
+                "error_code": "REQUEST_ERROR"
+            }
+        
+        # 401/403表示鉴权失败；200/400/404表示令牌已通过鉴权，只是任务不存在
+        if response.status_code in (401, 403):
+            return {
+                "valid": False,
+                "status_code": response.status_code,
+                "error": f"API rejected the token with status {response.status_code}",
+                "error_code": "INVALID_API_TOKEN"
+            }
+        if response.status_code in (200, 400, 404):
+            return {
+                "valid": True,
+                "status_code": response.status_code
+            }
+        return {
+            "valid": False,
+            "status_code": response.status_code,
+            "error": f"Unexpected status {response.status_code}: {response.text}",
+            "error_code": "API_ERROR"
+        }